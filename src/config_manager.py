@@ -1,30 +1,128 @@
 import os
+import re
+import json
 import logging
+import functools
 import yaml
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Any, List
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple, TYPE_CHECKING
 import threading
 
+from .utils import stat_or_none, ensure_directory, atomic_write_bytes
+
+if TYPE_CHECKING:
+    from watchdog.observers import Observer
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 logger = logging.getLogger(__name__)
 
+# Top-level `enabled: <false>` using the YAML 1.1 spellings PyYAML resolves to False
+_DISABLED_RE = re.compile(
+    rb'^enabled:[ \t]*(?:false|False|FALSE|no|No|NO|off|Off|OFF)[ \t]*(?:#.*)?\r?$',
+    re.M
+)
+_ENABLED_KEY_RE = re.compile(rb'^enabled:', re.M)
+PEEK_SIZE = 4096
+
+ACCOUNT_SCHEMA = {
+    "type": "object",
+    "required": ["account", "source"],
+    "properties": {
+        "account": {
+            "type": "object",
+            "required": ["username", "password"],
+        },
+        "source": {
+            "type": "object",
+            "required": ["host", "port", "protocol"],
+            "properties": {
+                "protocol": {"enum": ["imap", "pop3"]},
+            },
+        },
+    },
+}
+
+# Returned by _read_account_file for accounts skipped by the header peek; distinct
+# from None, which is what an empty YAML document parses to.
+_DISABLED = object()
+
+
+@dataclass(slots=True, frozen=True)
+class Account:
+    name: str
+    username: str
+    password: str
+    password_scheme: str
+    protocol: str
+    host: str
+    port: int
+    ssl: bool
+    source_username: Optional[str]
+    source_password: Optional[str]
+    keep_mail: bool
+    batch_limit: int
+    folders: Tuple[str, ...]
+    enabled: bool = True
+    
+    @classmethod
+    def from_config(cls, name: str, config: Dict[str, Any], default_keep_mail: bool = True) -> "Account":
+        account_info = config.get('account', {})
+        source_info = config.get('source', {})
+        fetch_info = config.get('fetch', {})
+        return cls(
+            name=name,
+            username=account_info.get('username'),
+            password=account_info.get('password'),
+            password_scheme=account_info.get('password_scheme', 'PLAIN'),
+            protocol=source_info.get('protocol', 'pop3'),
+            host=source_info.get('host'),
+            port=source_info.get('port'),
+            ssl=source_info.get('ssl', True),
+            source_username=source_info.get('username'),
+            source_password=source_info.get('password'),
+            keep_mail=fetch_info.get('keep_mail', default_keep_mail),
+            batch_limit=fetch_info.get('batch_limit', 100),
+            folders=tuple(fetch_info.get('folders', ['INBOX']) or ()),
+            enabled=config.get('enabled', True),
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_account_validator():
+    # Compiled on first use to keep fastjsonschema's codegen off the import path
+    import fastjsonschema
+    return fastjsonschema.compile(ACCOUNT_SCHEMA)
+
 
 class ConfigManager:
     
-    def __init__(self, config_dir: str = "/config"):
+    def __init__(self, config_dir: str = "/config", cache_dir: Optional[str] = "/data/cache/config"):
         self.config_dir = Path(config_dir)
+        # Parsed configs are mirrored here as JSON; /config itself may be read-only
+        self.cache_dir = Path(cache_dir) if cache_dir else None
         self.global_config_path = self.config_dir / "global.yaml"
         self.accounts_dir = self.config_dir / "accounts"
         
         self.global_config: Dict[str, Any] = {}
         self.account_configs: Dict[str, Dict[str, Any]] = {}
+        self.accounts: Dict[str, Account] = {}
+        # path -> (st_mtime_ns, st_size, parsed config); lets reloads skip unchanged files
+        self._parse_cache: Dict[str, Tuple[int, int, Any]] = {}
+        self._ssl_cert_st = None
+        self._ssl_key_st = None
+        self.ssl_enabled = False
         
     def load_all(self) -> None:
         logger.info("Loading configuration files...")
         self.global_config = self.load_global_config()
         self.account_configs = self.load_account_configs()
         self.validate_all()
+        self.accounts = self.build_accounts()
         self.check_security_warnings()
         logger.info(f"Configuration loaded: global config and {len(self.account_configs)} account configs.")
 
@@ -32,41 +130,163 @@ class ConfigManager:
         if not self.global_config_path.exists():
             # raise FileNotFoundError(f"Global config file not found: {self.global_config_path}")
             logger.warning(f"Global config file not found: {self.global_config_path}， using empty config instead.")
+            self._discard_sidecar(self._sidecar_path(self.global_config_path))
             return {}
             
         logger.info(f"Loading global config: {self.global_config_path}")
-        with open(self.global_config_path, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-        return config
+        return self._load_yaml_cached(self.global_config_path)
         
     def load_account_configs(self) -> Dict[str, Dict[str, Any]]:
         accounts = {}
         if not self.accounts_dir.exists():
             logger.warning(f"Accounts directory not found: {self.accounts_dir}")
+            self._prune_account_sidecars([])
             return accounts
             
-        for config_file in self.accounts_dir.glob("*.yaml"):
+        # Symlinks are followed so ConfigMap-style mounts keep working
+        with os.scandir(self.accounts_dir) as it:
+            entries = sorted(
+                (e for e in it if e.name.endswith('.yaml') and e.is_file()),
+                key=lambda e: Path(e.name).stem
+            )
+        self._prune_account_sidecars(Path(e.path) for e in entries)
+        disabled = 0
+        for entry in entries:
+            config_file = Path(entry.path)
             account_name = config_file.stem
             try:
-                logger.info(f"Loading account config: {config_file}")
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    config = yaml.safe_load(f)
-                accounts[account_name] = config
+                config = self._read_account_file(config_file, entry.stat)
             except Exception as e:
                 logger.error(f"Failed to load account config {config_file}: {e}")
+                continue
+            if config is _DISABLED:
+                logger.debug("Skipping disabled account config: %s", config_file)
+                accounts[account_name] = {'enabled': False}
+                disabled += 1
+            else:
+                logger.debug("Loaded account config: %s", config_file)
+                accounts[account_name] = config
+        logger.info("Loaded %d account configs from %s (%d disabled)", len(accounts), self.accounts_dir, disabled)
         return accounts
+
+    def _read_account_file(self, path: Path, stat=None) -> Any:
+        # Returns the parsed config, or _DISABLED when the header peek rules it out.
+        # stat is an optional callable so disabled files are never stat'ed.
+        if not self._peek_enabled(path):
+            return _DISABLED
+        return self._load_yaml_cached(path, stat() if stat else None)
+
+    def _peek_enabled(self, path: Path) -> bool:
+        # Only a single, definite `enabled: false` skips the full parse. Anything
+        # ambiguous (e.g. a duplicated key) falls back to parsing, and so does any
+        # file that doesn't fit in one read, since a later key could override it.
+        with open(path, 'rb') as f:
+            data = f.read(PEEK_SIZE + 1)
+        if len(data) > PEEK_SIZE or len(_ENABLED_KEY_RE.findall(data)) != 1:
+            return True
+        return _DISABLED_RE.search(data) is None
+
+    def _load_yaml_cached(self, path: Path, st: Optional[os.stat_result] = None) -> Any:
+        if st is None:
+            st = path.stat()
+        key = str(path)
+        cached = self._parse_cache.get(key)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        config = self._load_with_sidecar(path, st)
+        self._parse_cache[key] = (st.st_mtime_ns, st.st_size, config)
+        return config
+
+    def _sidecar_path(self, path: Path) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        try:
+            relative = path.relative_to(self.config_dir)
+        except ValueError:
+            return None
+        return self.cache_dir / relative.parent / (relative.name + '.cache.json')
+
+    def _load_with_sidecar(self, path: Path, st: os.stat_result) -> Any:
+        sidecar = self._sidecar_path(path)
+        if sidecar is not None:
+            try:
+                with open(sidecar, 'rb') as f:
+                    blob = json.load(f)
+                if blob['mtime'] == st.st_mtime_ns and blob['size'] == st.st_size:
+                    return blob['data']
+            except (OSError, KeyError, TypeError, ValueError):
+                pass
+                
+        with open(path, 'rb') as f:
+            config = yaml.load(f, Loader=SafeLoader)
+            
+        if sidecar is not None:
+            self._write_sidecar(sidecar, st, config)
+        return config
+
+    def _write_sidecar(self, sidecar: Path, st: os.stat_result, config: Any) -> None:
+        try:
+            data = json.dumps({'mtime': st.st_mtime_ns, 'size': st.st_size, 'data': config})
+        except (TypeError, ValueError):
+            # e.g. YAML timestamps have no JSON form
+            self._discard_sidecar(sidecar)
+            return
+        # Skip configs JSON can't represent faithfully (non-string keys, etc.)
+        if json.loads(data)['data'] != config:
+            self._discard_sidecar(sidecar)
+            return
+        try:
+            ensure_directory(str(sidecar.parent))
+            # Account configs hold credentials
+            atomic_write_bytes(sidecar, data.encode('utf-8'), mode=0o600)
+        except OSError as e:
+            logger.debug("Failed to write config cache %s: %s", sidecar, e)
+
+    def _discard_sidecar(self, sidecar: Optional[Path]) -> None:
+        # Sidecars hold credentials, so never leave one behind for a source that is gone
+        if sidecar is None:
+            return
+        try:
+            sidecar.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove config cache {sidecar}: {e}")
+
+    def _prune_account_sidecars(self, config_files: Iterable[Path]) -> None:
+        if self.cache_dir is None:
+            return
+        keep = {self._sidecar_path(f) for f in config_files}
+        sidecar_dir = self.cache_dir / self.accounts_dir.relative_to(self.config_dir)
+        try:
+            with os.scandir(sidecar_dir) as it:
+                stale = [Path(e.path) for e in it if e.name.endswith('.yaml.cache.json')]
+        except OSError:
+            return
+        for sidecar in stale:
+            if sidecar not in keep:
+                self._discard_sidecar(sidecar)
         
     def _deep_merge(self, default: Dict, override: Dict) -> Dict:
-        result = default.copy()
-        for key, value in override.items():
-            if key in result and isinstance(result[key], dict) and isinstance(value, dict):
-                result[key] = self._deep_merge(result[key], value)
-            else:
-                result[key] = value
+        result = dict(default)
+        stack = [(result, override)]
+        while stack:
+            dst, src = stack.pop()
+            for key, value in src.items():
+                current = dst.get(key)
+                if isinstance(current, dict) and isinstance(value, dict):
+                    # Only copy nested dicts that are actually merged into
+                    merged = dict(current)
+                    dst[key] = merged
+                    stack.append((merged, value))
+                else:
+                    dst[key] = value
         return result
         
     def validate_all(self) -> None:
         for account_name, config in self.account_configs.items():
+            if isinstance(config, dict) and not config.get('enabled', True):
+                continue
             try:
                 self._validate_account_config(account_name, config)
             except ValueError as e:
@@ -74,58 +294,168 @@ class ConfigManager:
                 raise
                 
     def _validate_account_config(self, account_name: str, config: Dict[str, Any]) -> None:
-        if 'account' not in config or 'source' not in config:
-            raise ValueError(f"Account '{account_name}' is missing required sections.")
-        account = config['account']
-        source = config['source']
-        if 'username' not in account or 'password' not in account:
-            raise ValueError(f"Account '{account_name}' is missing credentials.")
-        if 'protocol' not in source or source['protocol'] not in ['imap', 'pop3']:
-            raise ValueError(f"Account '{account_name}' has an invalid protocol.")
-        if 'host' not in source or 'port' not in source:
-            raise ValueError(f"Account '{account_name}' is missing server details.")
+        import fastjsonschema
+        try:
+            _get_account_validator()(config)
+        except fastjsonschema.JsonSchemaException as e:
+            raise ValueError(f"Account '{account_name}' is invalid: {e.message}") from e
             
     def check_security_warnings(self) -> None:
         ssl_cert = self.global_config.get('dovecot', {}).get('ssl_cert')
         ssl_key = self.global_config.get('dovecot', {}).get('ssl_key')
+        self._ssl_cert_st = None
+        self._ssl_key_st = None
         if not ssl_cert or not ssl_key:
             logger.warning("SSL certificates not configured. IMAPS (993) will be disabled.")
         else:
-            if not os.path.exists(ssl_cert):
+            self._ssl_cert_st = stat_or_none(ssl_cert)
+            self._ssl_key_st = stat_or_none(ssl_key)
+            if self._ssl_cert_st is None:
                 logger.error(f"SSL certificate file not found: {ssl_cert}")
-            if not os.path.exists(ssl_key):
+            if self._ssl_key_st is None:
                 logger.error(f"SSL key file not found: {ssl_key}")
-        for account_name, config in self.account_configs.items():
-            if config.get('account', {}).get('password_scheme', 'PLAIN') == 'PLAIN':
-                logger.warning(f"Account '{account_name}' uses plain text passwords. Consider using bcrypt.")
+        self.ssl_enabled = self._ssl_cert_st is not None and self._ssl_key_st is not None
+        self._warn_plain_passwords(self.accounts.values())
+        
+    def _warn_plain_passwords(self, accounts: Iterable[Account]) -> None:
+        for account in accounts:
+            if account.password_scheme == 'PLAIN':
+                logger.warning(f"Account '{account.name}' uses plain text passwords. Consider using bcrypt.")
                 
-    def get_enabled_accounts(self) -> List[Dict[str, Any]]:
-        enabled = []
-        for account_name, config in self.account_configs.items():
-            if config.get('enabled', True):
-                config['_account_name'] = account_name
-                enabled.append(config)
-        return enabled
+    def build_accounts(self, names: Optional[Iterable[str]] = None) -> Dict[str, Account]:
+        default_keep_mail = self.global_config.get('fetchmail', {}).get('keep_mail', True)
+        if names is None:
+            names = self.account_configs.keys()
+        accounts = {}
+        for account_name in names:
+            config = self.account_configs.get(account_name)
+            if config is not None and config.get('enabled', True):
+                accounts[account_name] = Account.from_config(account_name, config, default_keep_mail)
+        return accounts
+        
+    def reload_paths(self, paths: Iterable[str]) -> None:
+        # Re-parse and re-validate only the touched account files. A global.yaml
+        # change rebuilds every Account since account defaults depend on it.
+        # Nothing is updated unless every touched account validates.
+        global_path = os.path.abspath(self.global_config_path)
+        accounts_dir = os.path.abspath(self.accounts_dir)
+        global_changed = False
+        touched: Dict[str, Any] = {}
+        removed: Set[str] = set()
+        
+        for raw_path in paths:
+            path = os.path.abspath(raw_path)
+            if path == global_path:
+                global_changed = True
+                continue
+            if os.path.dirname(path) != accounts_dir or not path.endswith('.yaml'):
+                continue
+            config_file = Path(path)
+            account_name = config_file.stem
+            if not config_file.is_file():
+                logger.debug("Account config removed: %s", config_file)
+                removed.add(account_name)
+                self._parse_cache.pop(str(config_file), None)
+                self._discard_sidecar(self._sidecar_path(config_file))
+                continue
+            try:
+                config = self._read_account_file(config_file)
+            except Exception as e:
+                logger.error(f"Failed to load account config {config_file}: {e}")
+                continue
+            logger.debug("Reloaded account config: %s", config_file)
+            touched[account_name] = {'enabled': False} if config is _DISABLED else config
+            
+        for account_name, config in touched.items():
+            if isinstance(config, dict) and not config.get('enabled', True):
+                continue
+            try:
+                self._validate_account_config(account_name, config)
+            except ValueError as e:
+                logger.error(f"Account '{account_name}' validation failed: {e}")
+                raise
+                
+        if global_changed:
+            self.global_config = self.load_global_config()
+            
+        changed = removed | touched.keys()
+        account_configs = {k: v for k, v in self.account_configs.items() if k not in changed}
+        account_configs.update(touched)
+        # Keep the same order as a full load so generated files stay byte-identical
+        self.account_configs = dict(sorted(account_configs.items()))
+        
+        if global_changed:
+            self.accounts = self.build_accounts()
+            self.check_security_warnings()
+        else:
+            rebuilt = self.build_accounts(touched)
+            accounts = {k: v for k, v in self.accounts.items() if k not in changed}
+            accounts.update(rebuilt)
+            self.accounts = dict(sorted(accounts.items()))
+            self._warn_plain_passwords(rebuilt.values())
+        logger.info(
+            f"Configuration reloaded: {len(changed)} account configs"
+            f"{' and global config' if global_changed else ''} updated."
+        )
+        
+    def get_enabled_accounts(self) -> List[Account]:
+        return list(self.accounts.values())
 
 
-class ConfigChangeHandler(FileSystemEventHandler):
+class ConfigChangeHandler:
+    # Duck-types watchdog's FileSystemEventHandler (observers only call dispatch),
+    # so importing this module does not pull in watchdog.
+    
+    # Read-only events (opened, closed_no_write) are ignored; our own loads would
+    # otherwise retrigger a reload.
+    RELOAD_EVENT_TYPES = frozenset({'created', 'modified', 'moved', 'deleted'})
     
-    def __init__(self, callback):
-        super().__init__()
+    def __init__(self, callback, delay: float = 1.0):
+        # callback receives the set of changed .yaml paths since the last call
         self.callback = callback
+        self.delay = delay
         self.debounce_timer = None
+        self._changed_paths: Set[str] = set()
+        self._lock = threading.Lock()
         
-    def on_modified(self, event):
-        if event.is_directory or not event.src_path.endswith('.yaml'):
+    def dispatch(self, event):
+        self.on_any_event(event)
+        
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in self.RELOAD_EVENT_TYPES:
+            return
+        # A move touches both ends: the old name disappears, the new one appears
+        paths = [p for p in (event.src_path, getattr(event, 'dest_path', None)) if p and p.endswith('.yaml')]
+        if not paths:
             return
-        logger.info(f"Config file changed: {event.src_path}")
-        if self.debounce_timer:
-            self.debounce_timer.cancel()
-        self.debounce_timer = threading.Timer(1.0, self.callback)
+        logger.info(f"Config file changed: {paths[-1]}")
+        with self._lock:
+            self._changed_paths.update(paths)
+            if self.debounce_timer is None or not self.debounce_timer.is_alive():
+                self._arm_timer()
+                
+    def _arm_timer(self) -> None:
+        self.debounce_timer = threading.Timer(self.delay, self._fire)
+        self.debounce_timer.daemon = True
         self.debounce_timer.start()
+        
+    def _fire(self) -> None:
+        with self._lock:
+            changed, self._changed_paths = self._changed_paths, set()
+        try:
+            self.callback(changed)
+        finally:
+            # A change that arrived while the callback ran gets exactly one follow-up
+            with self._lock:
+                if self._changed_paths:
+                    self._arm_timer()
+                else:
+                    self.debounce_timer = None
 
 
-def watch_config_changes(config_dir: str, callback) -> Observer:
+def watch_config_changes(config_dir: str, callback) -> "Observer":
+    from watchdog.observers import Observer
+    
     event_handler = ConfigChangeHandler(callback)
     observer = Observer()
     observer.schedule(event_handler, config_dir, recursive=True)
@@ -1,48 +1,70 @@
 import os
 import logging
 from pathlib import Path
-from typing import Dict, Any, List
-from jinja2 import Environment, FileSystemLoader
+from typing import Dict, Any, List, Optional
+
+from .config_manager import Account
+from .utils import get_template, stat_or_none, write_if_changed
 
 logger = logging.getLogger(__name__)
 
+VMAIL_UID = 5000
+VMAIL_GID = 5000
+
+
+def _ensure_owned(path: Path, uid: int = VMAIL_UID, gid: int = VMAIL_GID) -> None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        os.makedirs(path, exist_ok=True)
+        st = os.stat(path)
+    if st.st_uid == uid and st.st_gid == gid:
+        return
+    try:
+        os.chown(path, uid, gid)
+    except Exception as e:
+        logger.warning(f"Failed to set owner for {path}: {e}")
+
 
 class DovecotGenerator:
     
     def __init__(self, template_dir: str = "/app/templates"):
         self.template_dir = Path(template_dir)
-        self.env = Environment(loader=FileSystemLoader(str(self.template_dir)))
+        self._last_hashes: Dict[str, bytes] = {}
         
     def generate_config(
         self,
         global_config: Dict[str, Any],
-        account_configs: List[Dict[str, Any]],
+        accounts: List[Account],
         dovecot_conf_path: str = "/etc/dovecot/dovecot.conf",
-        users_file_path: str = "/etc/dovecot/users"
+        users_file_path: str = "/etc/dovecot/users",
+        ssl_enabled: Optional[bool] = None
     ) -> None:
         logger.info("Generating Dovecot configuration...")
-        self._generate_main_config(global_config, dovecot_conf_path)
-        self._generate_users_file(account_configs, users_file_path)
-        self._create_mailbox_directories(account_configs)
+        self._generate_main_config(global_config, dovecot_conf_path, ssl_enabled)
+        self._generate_users_file(accounts, users_file_path)
+        self._create_mailbox_directories(accounts)
         logger.info("Dovecot configuration generated.")
         
     def _generate_main_config(
         self,
         global_config: Dict[str, Any],
-        output_path: str
+        output_path: str,
+        ssl_enabled: Optional[bool] = None
     ) -> None:
         dovecot_config = global_config.get('dovecot', {})
         ssl_cert = dovecot_config.get('ssl_cert')
         ssl_key = dovecot_config.get('ssl_key')
-        ssl_enabled = False
         
         if ssl_cert and ssl_key:
-            if os.path.exists(ssl_cert) and os.path.exists(ssl_key):
-                ssl_enabled = True
+            if ssl_enabled is None:
+                ssl_enabled = stat_or_none(ssl_cert) is not None and stat_or_none(ssl_key) is not None
+            if ssl_enabled:
                 logger.info(f"SSL enabled: {ssl_cert}")
             else:
                 logger.warning("SSL certificate files not found. IMAPS disabled.")
         else:
+            ssl_enabled = False
             logger.warning("SSL certificates not configured. IMAPS disabled.")
             
         template_data = {
@@ -56,108 +78,62 @@ class DovecotGenerator:
             'mail_location': '/data/mail/%u',
         }
         
-        template = self.env.get_template('dovecot.conf.j2')
+        template = get_template(str(self.template_dir), 'dovecot.conf.j2')
         content = template.render(**template_data)
         
         output_file = Path(output_path)
         output_file.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(content)
+        if not write_if_changed(output_file, content.encode('utf-8'), self._last_hashes, mode=0o644):
+            logger.info(f"Main config unchanged, skipping write: {output_path}")
+            return
             
         logger.info(f"Main config generated: {output_path}")
         
     def _generate_users_file(
         self,
-        account_configs: List[Dict[str, Any]],
+        accounts: List[Account],
         output_path: str
     ) -> None:
-        users_data = []
-        
-        for account in account_configs:
-            account_name = account.get('_account_name', 'unknown')
-            account_info = account.get('account', {})
-            
-            username = account_info.get('username')
-            password = account_info.get('password')
-            password_scheme = account_info.get('password_scheme', 'PLAIN')
-            
-            users_data.append({
-                'username': username,
-                'password': password,
-                'password_scheme': password_scheme,
-            })
-            
-        template = self.env.get_template('dovecot-users.j2')
-        content = template.render(users=users_data)
+        template = get_template(str(self.template_dir), 'dovecot-users.j2')
+        content = template.render(users=accounts)
         
         output_file = Path(output_path)
         output_file.parent.mkdir(parents=True, exist_ok=True)
+        if not write_if_changed(
+            output_file, content.encode('utf-8'), self._last_hashes, mode=0o640, uid=0, gid=102
+        ):
+            logger.info(f"User file unchanged, skipping write: {output_path}")
+            return
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(content)
-            
-        os.chmod(output_file, 0o640)
-        os.chown(output_file, 0, 102)
+        logger.info(f"User file generated: {output_path} ({len(accounts)} users)")
         
-        logger.info(f"User file generated: {output_path} ({len(users_data)} users)")
-        
-    def _create_mailbox_directories(self, account_configs: List[Dict[str, Any]]) -> None:
+    def _create_mailbox_directories(self, accounts: List[Account]) -> None:
         mail_base_dir = Path("/data/mail")
-        mail_base_dir.mkdir(parents=True, exist_ok=True)
+        fts_base_dir = Path("/data/fts")
+        subdirs = ('cur', 'new', 'tmp')
         
-        try:
-            os.chown(mail_base_dir, 5000, 5000)
-        except Exception as e:
-            logger.warning(f"Failed to set owner for {mail_base_dir}: {e}")
+        user_mail_dirs = []
+        paths = [mail_base_dir, fts_base_dir]
         
-        for account in account_configs:
-            account_info = account.get('account', {})
-            username = account_info.get('username')
+        for account in accounts:
+            username = account.username
             
             if not username:
                 continue
                 
             user_mail_dir = mail_base_dir / username
-            user_mail_dir.mkdir(parents=True, exist_ok=True)
-            
-            for subdir in ['cur', 'new', 'tmp']:
-                subdir_path = user_mail_dir / subdir
-                subdir_path.mkdir(parents=True, exist_ok=True)
-                try:
-                    os.chown(subdir_path, 5000, 5000)
-                except Exception as e:
-                    logger.warning(f"Failed to set owner for {subdir_path}: {e}")
-            
-            try:
-                os.chown(user_mail_dir, 5000, 5000)
-            except Exception as e:
-                logger.warning(f"Failed to set owner for {user_mail_dir}: {e}")
-                
-            logger.info(f"Mailbox directory created: {user_mail_dir}")
+            user_mail_dirs.append(user_mail_dir)
+            paths.append(user_mail_dir)
+            paths.extend(user_mail_dir / subdir for subdir in subdirs)
+            paths.append(fts_base_dir / username)
             
-        fts_base_dir = Path("/data/fts")
-        fts_base_dir.mkdir(parents=True, exist_ok=True)
-        
-        try:
-            os.chown(fts_base_dir, 5000, 5000)
-        except Exception as e:
-            logger.warning(f"Failed to set owner for {fts_base_dir}: {e}")
-        
-        for account in account_configs:
-            account_info = account.get('account', {})
-            username = account_info.get('username')
-            
-            if not username:
-                continue
-                
-            user_fts_dir = fts_base_dir / username
-            user_fts_dir.mkdir(parents=True, exist_ok=True)
+        for path in paths:
+            _ensure_owned(path)
             
-            try:
-                os.chown(user_fts_dir, 5000, 5000)
-            except Exception as e:
-                logger.warning(f"Failed to set owner for {user_fts_dir}: {e}")
+        if logger.isEnabledFor(logging.DEBUG):
+            for user_mail_dir in user_mail_dirs:
+                logger.debug("Mailbox directory ready: %s", user_mail_dir)
+        logger.info("Mailbox directories ready for %d accounts", len(user_mail_dirs))
             
     def test_config(self, config_path: str = "/etc/dovecot/dovecot.conf") -> bool:
         import subprocess
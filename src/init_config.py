@@ -48,7 +48,8 @@ def init_configs(config_dir: str = "/config") -> int:
         logger.info("Generating Dovecot configuration...")
         dovecot_generator.generate_config(
             global_config,
-            account_configs
+            account_configs,
+            ssl_enabled=config_manager.ssl_enabled
         )
         logger.info("Dovecot configuration generated successfully")
         
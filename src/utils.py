@@ -1,9 +1,19 @@
 import os
 import sys
+import stat
+import hashlib
+import functools
 import logging
 import logging.handlers
 import subprocess
-from typing import Optional
+from typing import Dict, Iterable, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from jinja2 import Environment, Template
+
+logger = logging.getLogger(__name__)
+
+JINJA_CACHE_DIR = "/data/cache/jinja"
 
 
 def setup_logger(
@@ -43,33 +53,190 @@ def setup_logger(
     return logger
 
 
-def hash_password(password: str) -> str:
+def default_bcrypt_rounds() -> int:
+    value = os.environ.get('MAILHARBOR_BCRYPT_ROUNDS', '12')
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Invalid MAILHARBOR_BCRYPT_ROUNDS value {value!r}, using 12.")
+        return 12
+
+
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
     """
     Hash a password using bcrypt.
 
+    Each extra round doubles the hashing cost; 12 takes roughly 250ms.
+    Lower values are fine for development but weaken stored hashes.
+
     Args:
         password: Plaintext password.
+        rounds: bcrypt cost factor. Defaults to MAILHARBOR_BCRYPT_ROUNDS, else 12.
 
     Returns:
         Hashed password.
     """
     try:
         import bcrypt
-        salt = bcrypt.gensalt(rounds=12)
+        if rounds is None:
+            rounds = default_bcrypt_rounds()
+        salt = bcrypt.gensalt(rounds=rounds)
         hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
         return hashed.decode('utf-8')
     except ImportError:
         raise ImportError("Install bcrypt: pip install bcrypt")
 
+
+def hash_passwords_batch(passwords: Iterable[str], rounds: Optional[int] = None) -> List[str]:
+    """
+    Hash several passwords in parallel.
+
+    bcrypt releases the GIL while hashing, so threads scale across cores
+    without the cost of forking worker processes.
+
+    Args:
+        passwords: Plaintext passwords.
+        rounds: bcrypt cost factor, as for hash_password.
+
+    Returns:
+        Hashed passwords, in input order.
+    """
+    passwords = list(passwords)
+    if len(passwords) <= 1:
+        return [hash_password(p, rounds) for p in passwords]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(len(passwords), os.cpu_count() or 1)) as executor:
+        return list(executor.map(lambda p: hash_password(p, rounds), passwords))
+
 def ensure_directory(path: str, mode: int = 0o755) -> None:
     os.makedirs(path, mode=mode, exist_ok=True)
 
 
+def stat_or_none(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
 def ensure_file_permissions(path: str, mode: int = 0o600) -> None:
     if os.path.exists(path):
         os.chmod(path, mode)
 
 
+def atomic_write_bytes(
+    path: str,
+    data: bytes,
+    mode: int = 0o644,
+    uid: Optional[int] = None,
+    gid: Optional[int] = None
+) -> None:
+    path = os.fspath(path)
+    tmp = f"{path}.tmp.{os.getpid()}"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        os.fchmod(fd, mode)  # os.open's mode is masked by the umask
+        if uid is not None or gid is not None:
+            os.fchown(fd, -1 if uid is None else uid, -1 if gid is None else gid)
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+        os.fsync(fd)
+    except BaseException:
+        os.close(fd)
+        os.unlink(tmp)
+        raise
+    os.close(fd)
+    os.replace(tmp, path)
+
+
+def content_digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def write_if_changed(
+    path: str,
+    data: bytes,
+    last_hashes: Dict[str, bytes],
+    mode: int = 0o644,
+    uid: Optional[int] = None,
+    gid: Optional[int] = None
+) -> bool:
+    """
+    Atomically write data to path unless the file already holds the same bytes.
+
+    Args:
+        path: Output file path.
+        data: Encoded file content.
+        last_hashes: Per-caller map of path -> digest of the last known content.
+            Seeded from the existing file on first use.
+
+    Returns:
+        True if the file was written, False if its content was already current
+        (mode and owner are still corrected).
+    """
+    path = os.fspath(path)
+    digest = content_digest(data)
+    if path not in last_hashes:
+        try:
+            with open(path, 'rb') as f:
+                last_hashes[path] = content_digest(f.read())
+        except OSError:
+            pass
+    if last_hashes.get(path) == digest:
+        st = stat_or_none(path)
+        if st is not None:
+            # Content is current, but still repair mode/owner like a fresh write would
+            if stat.S_IMODE(st.st_mode) != mode:
+                os.chmod(path, mode)
+            if (uid is not None and st.st_uid != uid) or (gid is not None and st.st_gid != gid):
+                os.chown(path, -1 if uid is None else uid, -1 if gid is None else gid)
+            return False
+    atomic_write_bytes(path, data, mode=mode, uid=uid, gid=gid)
+    last_hashes[path] = digest
+    return True
+
+
+@functools.lru_cache(maxsize=None)
+def get_template_env(template_dir: str) -> "Environment":
+    from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+
+    class BestEffortBytecodeCache(FileSystemBytecodeCache):
+        # A full or read-only /data must never stop templates from rendering
+
+        def load_bytecode(self, bucket):
+            try:
+                super().load_bytecode(bucket)
+            except OSError as e:
+                logger.debug("Failed to read Jinja bytecode cache: %s", e)
+
+        def dump_bytecode(self, bucket):
+            try:
+                super().dump_bytecode(bucket)
+            except OSError as e:
+                logger.debug("Failed to write Jinja bytecode cache: %s", e)
+
+    # One Environment per template dir, shared by every generator, so compiled
+    # templates survive generator re-creation
+    try:
+        ensure_directory(JINJA_CACHE_DIR)
+        bytecode_cache = BestEffortBytecodeCache(directory=JINJA_CACHE_DIR)
+    except OSError as e:
+        logger.warning(f"Jinja bytecode cache disabled: {e}")
+        bytecode_cache = None
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        bytecode_cache=bytecode_cache
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_template(template_dir: str, name: str) -> "Template":
+    # Templates ship with the image, so resolve each one once per process
+    return get_template_env(template_dir).get_template(name)
+
+
 def main():
     import argparse
 
@@ -84,22 +251,31 @@ def main():
         nargs='*',
         help='Command arguments.'
     )
+    parser.add_argument(
+        '--rounds',
+        type=int,
+        default=None,
+        help='bcrypt cost factor (default: $MAILHARBOR_BCRYPT_ROUNDS, else 12).'
+    )
 
     args = parser.parse_args()
 
     if args.command == 'hash_password':
         if not args.args:
-            print("Usage: python -m src.utils hash_password <password>")
+            print("Usage: python -m src.utils hash_password <password> [<password> ...]")
             sys.exit(1)
 
-        password = args.args[0]
-        hashed = hash_password(password)
-        print(f"Plaintext: {password}")
-        print(f"Hashed: {hashed}")
-        print("\nUse in config:")
-        print(f"  password: \"{hashed}\"")
-        print(f"  password_scheme: BLF-CRYPT")
+        hashes = hash_passwords_batch(args.args, rounds=args.rounds)
+        for i, (password, hashed) in enumerate(zip(args.args, hashes)):
+            if i:
+                print()
+            print(f"Plaintext: {password}")
+            print(f"Hashed: {hashed}")
+            print("\nUse in config:")
+            print(f"  password: \"{hashed}\"")
+            print(f"  password_scheme: BLF-CRYPT")
 
 
 if __name__ == '__main__':
     main()
+